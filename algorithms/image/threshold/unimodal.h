@@ -41,13 +41,15 @@ namespace dials { namespace algorithms {
     double m = (y1 - y0) / (x1 - x0);
     double c = y0 - m * x0;
 
-    // Find the maximum deviation from the line
+    // Find the maximum deviation from the line. The perpendicular distance is
+    // |m * x - y + c| / sqrt(m * m + 1); the denominator is the same for every
+    // bin so it does not affect which bin is furthest from the line.
     std::size_t imax = i0;
     double dmax = 0;
     for (std::size_t i = i0 + 1; i <= i1; ++i) {
       double x = i + 0.5;
       double y = histo[i];
-      double d = std::abs(m * x - y + c) / std::sqrt(m * m + 1);
+      double d = std::abs(m * x - y + c);
       if (d > dmax) {
         dmax = d;
         imax = i;
@@ -67,17 +69,20 @@ namespace dials { namespace algorithms {
   inline af::shared<double> probability_distribution(
     const af::const_ref<int, af::c_grid<2> > &image,
     int2 range) {
-    // Get the histogram range
+    // Get the histogram range. The maximum image value bounds the size of the
+    // histogram, which could otherwise be very large for wide trusted ranges.
     int minh = range[0];
     int maxi = max(image);
     int maxh = min(int2(maxi, range[1]).const_ref());
+    DIALS_ASSERT(maxh >= minh);
 
     // Histogram the image
-    af::shared<double> p(maxh - minh + 1, af::init_functor_null<double>());
+    af::shared<double> p(maxh - minh + 1, 0.0);
     std::size_t count = 0;
     for (std::size_t i = 0; i < image.size(); ++i) {
-      if (minh <= image[i] && image[i] <= maxh) {
-        p[image[i] - minh] += 1;
+      int v = image[i];
+      if (minh <= v && v <= maxh) {
+        p[v - minh] += 1;
         count++;
       }
     }
@@ -86,8 +91,9 @@ namespace dials { namespace algorithms {
     DIALS_ASSERT(count > 0);
 
     // Make into probability distribution
+    double scale = 1.0 / count;
     for (std::size_t i = 0; i < p.size(); ++i) {
-      p[i] /= count;
+      p[i] *= scale;
     }
 
     // Return the probability distribution
@@ -5,6 +5,8 @@
 
 import math
 
+import numpy as np
+
 from scitbx.math.periodogram import Periodogram
 
 from dials.array_family import flex
@@ -12,6 +14,74 @@
 RAD2DEG = 180.0 / math.pi
 
 
+def _block_edges(phi_start, block_size, nblocks):
+    """Return the internal boundaries between nblocks blocks of width block_size
+    starting at phi_start. Each block is a half-open interval, except the final
+    block, which also includes the maximum value of phi"""
+    return phi_start + block_size * np.arange(1, nblocks)
+
+
+def _block_counts(phi_sorted, edges):
+    """Return the number of values of phi (a sorted numpy array) in each block"""
+    bounds = np.searchsorted(phi_sorted, edges, side="left")
+    return np.diff(np.concatenate(([0], bounds, [len(phi_sorted)])))
+
+
+def _block_indices(phi, edges):
+    """Return the index of the block each value of phi (a numpy array) falls in"""
+    return np.searchsorted(edges, phi, side="right")
+
+
+def _block_means(idx, values, counts):
+    """Return the mean of the values (a numpy array) in each block given the block
+    indices idx and the number of values per block. Empty blocks get zero."""
+    sums = np.bincount(idx, weights=values, minlength=len(counts))
+    means = np.zeros(len(counts))
+    np.divide(sums, counts, out=means, where=counts > 0)
+    return flex.double(means)
+
+
+def _find_blocks(phi, phi_start, phi_width):
+    """Find a block size for the analysis of residuals from the values of phi (a
+    numpy array, in degrees) such that the blocks contain at least 50 reflections
+    each, where possible. Return the number of blocks, their width, the internal
+    block edges and the number of reflections in each block"""
+    ideal_block_size = 1.0
+    if phi_width <= ideal_block_size:
+        # a single block covers the whole scan, so there is no search
+        nblocks = 1
+        block_size = phi_width
+        edges = _block_edges(phi_start, block_size, nblocks)
+        counts = np.array([len(phi)])
+    else:
+        # sort once, so that the search only has to locate block edges
+        phi_sorted = np.sort(phi)
+        old_nblocks = 0
+        while True:
+            nblocks = int(phi_width // ideal_block_size)
+            if nblocks == old_nblocks:
+                nblocks -= 1
+            nblocks = max(nblocks, 1)
+            block_size = phi_width / nblocks
+            edges = _block_edges(phi_start, block_size, nblocks)
+            counts = _block_counts(phi_sorted, edges)
+            # Break if there are enough reflections, otherwise increase block
+            # size, unless only one block remains
+            if nblocks == 1:
+                break
+            min_nr = int(counts.min())
+            if min_nr >= 50:
+                break
+            if min_nr < 5:
+                fac = 2
+            else:
+                fac = 50 / min_nr
+            ideal_block_size *= fac
+            old_nblocks = nblocks
+
+    return nblocks, block_size, edges, counts
+
+
 class CentroidAnalyser(object):
     def __init__(self, reflections, av_callback=flex.mean, debug=False):
 
@@ -22,78 +92,78 @@ def __init__(self, reflections, av_callback=flex.mean, debug=False):
         self._av_callback = av_callback
 
         # Remove invalid reflections
-        reflections = reflections.select(~(reflections["miller_index"] == (0, 0, 0)))
-        x, y, z = reflections["xyzcal.mm"].parts()
-        sel = (x == 0) & (y == 0)
-        reflections = reflections.select(~sel)
+        x, y, _ = reflections["xyzcal.mm"].parts()
+        invalid = (reflections["miller_index"] == (0, 0, 0)) | ((x == 0) & (y == 0))
+        reflections = reflections.select(~invalid)
         self._nexp = flex.max(reflections["id"]) + 1
 
         # Ensure required keys are present
         if not all(k in reflections for k in ["x_resid", "y_resid", "phi_resid"]):
-            x_obs, y_obs, phi_obs = reflections["xyzobs.mm.value"].parts()
-            x_cal, y_cal, phi_cal = reflections["xyzcal.mm"].parts()
-
-            # do not wrap around multiples of 2*pi; keep the full rotation
-            # from zero to differentiate repeat observations.
+            xyz_obs = reflections["xyzobs.mm.value"].as_double().as_numpy_array()
+            xyz_cal = reflections["xyzcal.mm"].as_double().as_numpy_array()
+            xyz_obs = xyz_obs.reshape(-1, 3)
+            xyz_cal = xyz_cal.reshape(-1, 3)
 
+            # phi itself is not wrapped, so the full rotation from zero is kept;
+            # only the residual is folded into [-pi, pi)
             TWO_PI = 2.0 * math.pi
-            resid = phi_cal - (flex.fmod_positive(phi_obs, TWO_PI))
-            # ensure this is the smaller of two possibilities
-            resid = flex.fmod_positive((resid + math.pi), TWO_PI) - math.pi
-            phi_cal = phi_obs + resid
-            reflections["x_resid"] = x_cal - x_obs
-            reflections["y_resid"] = y_cal - y_obs
-            reflections["phi_resid"] = phi_cal - phi_obs
-
-        # create empty results list
+            resid = xyz_cal[:, 2] - xyz_obs[:, 2]
+            resid = np.remainder(resid + math.pi, TWO_PI) - math.pi
+            reflections["x_resid"] = flex.double(xyz_cal[:, 0] - xyz_obs[:, 0])
+            reflections["y_resid"] = flex.double(xyz_cal[:, 1] - xyz_obs[:, 1])
+            reflections["phi_resid"] = flex.double(resid)
+
+        # sort reflections by experiment once, so that each experiment is a
+        # contiguous slice of the table
+        ids = reflections["id"].as_numpy_array()
+        order = np.argsort(ids, kind="stable")
+        reflections = reflections.select(flex.size_t(order))
+        ids = ids[order]
+        exp_ids = np.arange(self._nexp)
+        self._exp_slices = [
+            slice(int(start), int(end))
+            for start, end in zip(
+                np.searchsorted(ids, exp_ids, side="left"),
+                np.searchsorted(ids, exp_ids, side="right"),
+            )
+        ]
+
+        # keep the residuals together as one (3, N) array, so that each
+        # component for any experiment is a contiguous view
+        self._resid = np.array(
+            [
+                reflections[k].as_numpy_array()
+                for k in ("x_resid", "y_resid", "phi_resid")
+            ]
+        )
+
+        # create empty results list, and a parallel list to cache the block that
+        # each reflection falls in for each experiment
         self._results = []
+        self._block_idx = []
 
         # first, just determine a suitable block size for analysis
+        phi_obs_deg = (
+            reflections["xyzobs.mm.value"].parts()[2].as_numpy_array() * RAD2DEG
+        )
         for iexp in range(self._nexp):
-            ref_this_exp = reflections.select(reflections["id"] == iexp)
-            if len(ref_this_exp) == 0:
+            if self._exp_slices[iexp].stop == self._exp_slices[iexp].start:
                 # can't do anything, just keep an empty dictionary
                 self._results.append({})
+                self._block_idx.append(None)
                 continue
-            phi_obs_deg = ref_this_exp["xyzobs.mm.value"].parts()[2] * RAD2DEG
-            phi_range = flex.min(phi_obs_deg), flex.max(phi_obs_deg)
+            phi_np = phi_obs_deg[self._exp_slices[iexp]]
+            phi_range = float(phi_np.min()), float(phi_np.max())
             phi_width = phi_range[1] - phi_range[0]
-            ideal_block_size = 1.0
-            old_nblocks = 0
-            while True:
-                nblocks = int(phi_width // ideal_block_size)
-                if nblocks == old_nblocks:
-                    nblocks -= 1
-                nblocks = max(nblocks, 1)
-                block_size = phi_width / nblocks
-                nr = flex.int()
-                for i in range(nblocks - 1):
-                    blk_start = phi_range[0] + i * block_size
-                    blk_end = blk_start + block_size
-                    sel = (phi_obs_deg >= blk_start) & (phi_obs_deg < blk_end)
-                    nref_in_block = sel.count(True)
-                    nr.append(nref_in_block)
-                # include max phi in the final block
-                blk_start = phi_range[0] + (nblocks - 1) * block_size
-                blk_end = phi_range[1]
-                sel = (phi_obs_deg >= blk_start) & (phi_obs_deg <= blk_end)
-                nref_in_block = sel.count(True)
-                nr.append(nref_in_block)
-                # Break if there are enough reflections, otherwise increase block size,
-                # unless only one block remains
-                if nblocks == 1:
-                    break
-                min_nr = flex.min(nr)
-                if min_nr >= 50:
-                    break
-                if min_nr < 5:
-                    fac = 2
-                else:
-                    fac = 50 / min_nr
-                ideal_block_size *= fac
-                old_nblocks = nblocks
+            nblocks, block_size, edges, counts = _find_blocks(
+                phi_np, phi_range[0], phi_width
+            )
 
             # collect the basic data for this experiment
+            nr = flex.int(counts.astype(np.int32))
+            # store the block indices in the smallest integer type that holds them
+            idx = _block_indices(phi_np, edges)
+            self._block_idx.append(idx.astype(np.min_scalar_type(nblocks)))
             self._results.append(
                 {
                     "block_size": block_size,
@@ -127,30 +197,25 @@ def __call__(
                 block_size = results_this_exp.get("block_size")
                 if block_size is None:
                     continue
-                phi_range = results_this_exp["phi_range"]
                 nblocks = results_this_exp["nblocks"]
-                ref_this_exp = self._reflections.select(self._reflections["id"] == iexp)
-                x_resid = ref_this_exp["x_resid"]
-                y_resid = ref_this_exp["y_resid"]
-                phi_resid = ref_this_exp["phi_resid"]
-                phi_obs_deg = ref_this_exp["xyzobs.mm.value"].parts()[2] * RAD2DEG
-                xr_per_blk = flex.double()
-                yr_per_blk = flex.double()
-                pr_per_blk = flex.double()
-                for i in range(nblocks - 1):
-                    blk_start = phi_range[0] + i * block_size
-                    blk_end = blk_start + block_size
-                    sel = (phi_obs_deg >= blk_start) & (phi_obs_deg < blk_end)
-                    xr_per_blk.append(self._av_callback(x_resid.select(sel)))
-                    yr_per_blk.append(self._av_callback(y_resid.select(sel)))
-                    pr_per_blk.append(self._av_callback(phi_resid.select(sel)))
-                # include max phi in the final block
-                blk_start = phi_range[0] + (nblocks - 1) * block_size
-                blk_end = phi_range[1]
-                sel = (phi_obs_deg >= blk_start) & (phi_obs_deg <= blk_end)
-                xr_per_blk.append(self._av_callback(x_resid.select(sel)))
-                yr_per_blk.append(self._av_callback(y_resid.select(sel)))
-                pr_per_blk.append(self._av_callback(phi_resid.select(sel)))
+                resid = self._resid[:, self._exp_slices[iexp]]
+                idx = self._block_idx[iexp]
+                if self._av_callback is flex.mean:
+                    # fast path: all block means from weighted bincounts
+                    counts = results_this_exp["nref_per_block"].as_numpy_array()
+                    xr_per_blk, yr_per_blk, pr_per_blk = (
+                        _block_means(idx, r, counts) for r in resid
+                    )
+                else:
+                    x_resid, y_resid, phi_resid = (flex.double(r) for r in resid)
+                    xr_per_blk = flex.double(nblocks)
+                    yr_per_blk = flex.double(nblocks)
+                    pr_per_blk = flex.double(nblocks)
+                    for i in range(nblocks):
+                        sel = flex.bool(idx == i)
+                        xr_per_blk[i] = self._av_callback(x_resid.select(sel))
+                        yr_per_blk[i] = self._av_callback(y_resid.select(sel))
+                        pr_per_blk[i] = self._av_callback(phi_resid.select(sel))
                 # the first and last block of average residuals (especially those in
                 # phi) are usually bad because rocking curves are truncated at the
                 # edges of the scan. When we have enough blocks and they are narrow,
@@ -167,6 +232,8 @@ def __call__(
                 results_this_exp["av_y_resid_per_block"] = yr_per_blk
                 results_this_exp["av_phi_resid_per_block"] = pr_per_blk
             self._average_residuals = True
+            # the cached block indices are no longer needed
+            self._block_idx = None
 
         # Perform power spectrum analysis on the residuals, converted to microns
         # and mrad to avoid tiny numbers
@@ -6,6 +6,7 @@
 """
 from __future__ import absolute_import, division, print_function
 
+import numpy as np
 from orderedset import OrderedSet
 
 from cctbx import crystal, miller, uctbx
@@ -37,6 +38,19 @@ def get_sorted_asu_indices(asu_indices, space_group, anomalous=False):
     return sorted_asu_miller_index, permuted
 
 
+def _run_starts_and_lengths(sorted_asu_indices):
+    """Return the start positions and lengths of runs of identical miller indices
+    in a sorted flex.miller_index array, as numpy arrays."""
+    hkl = sorted_asu_indices.as_vec3_double().as_double().as_numpy_array()
+    hkl = hkl.reshape(-1, 3)
+    if not hkl.size:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    changes = np.any(hkl[1:] != hkl[:-1], axis=1)
+    run_starts = np.concatenate(([0], np.flatnonzero(changes) + 1))
+    run_lengths = np.diff(np.concatenate((run_starts, [len(hkl)])))
+    return run_starts, run_lengths
+
+
 class IhTable(object):
     """
     A class to manage access to Ih_table blocks.
@@ -138,7 +152,7 @@ def update_data_in_blocks(self, data, dataset_id, column="intensity"):
             data_for_block = data.select(block.block_selections[dataset_id])
             start = block.dataset_info[dataset_id]["start_index"]
             end = block.dataset_info[dataset_id]["end_index"]
-            sel = flex.size_t(range(start, end))
+            sel = flex.size_t_range(start, end)
             block.Ih_table[column].set_selected(sel, data_for_block)
 
     def get_block_selections_for_dataset(self, dataset):
@@ -206,11 +220,15 @@ def _determine_required_block_structures(self, reflection_tables):
                     table["miller_index"], self.space_group, self.anomalous
                 )
             joint_asu_indices.extend(table["asu_miller_index"])
-        sorted_joint_asu_indices, _ = get_sorted_asu_indices(
-            joint_asu_indices, self.space_group, self.anomalous
+        # Only the unique indices in sorted order and their multiplicities are
+        # needed here, rather than the sorted reflections, so get these from a
+        # single lexicographic sort of the (h, k, l) rows. This is the same order
+        # as sorting by packed indices.
+        hkl = joint_asu_indices.as_vec3_double().as_double().as_numpy_array()
+        unique_hkl, group_sizes = np.unique(
+            hkl.reshape(-1, 3).astype(np.int64), axis=0, return_counts=True
         )
-
-        asu_index_set = OrderedSet(sorted_joint_asu_indices)
+        asu_index_set = [tuple(index) for index in unique_hkl.tolist()]
         n_unique_groups = len(asu_index_set)
         self.n_work_blocks = min(self.n_work_blocks, n_unique_groups)
         # also record how many unique groups go into each block
@@ -238,23 +256,11 @@ def _determine_required_block_structures(self, reflection_tables):
         self.properties_dict["n_unique_in_each_block"].append(group_id_in_block_i)
         self.properties_dict["miller_index_boundaries"].append((10000, 10000, 10000))
         # ^ to avoid bounds checking when in last group
-        # need to know how many reflections will be in each block also
-
-        block_id = 0
-        idx_prev = 0
-        boundary = self.properties_dict["miller_index_boundaries"][0]
-        for i, index in enumerate(sorted_joint_asu_indices):
-            if index == boundary:
-                n_in_prev_group = i - idx_prev
-                self.properties_dict["n_reflections_in_each_block"][
-                    block_id
-                ] = n_in_prev_group
-                block_id += 1
-                boundary = self.properties_dict["miller_index_boundaries"][block_id]
-                idx_prev = i
-        self.properties_dict["n_reflections_in_each_block"][block_id] = (
-            len(sorted_joint_asu_indices) - idx_prev
-        )
+        # need to know how many reflections will be in each block also, which is
+        # the total size of the groups in that block
+        n_refl_per_block = np.add.reduceat(group_sizes, group_boundaries[:-1])
+        for block_id, n_refl in enumerate(n_refl_per_block):
+            self.properties_dict["n_reflections_in_each_block"][block_id] = int(n_refl)
 
     def _create_empty_Ih_table_blocks(self):
         for n in range(self.n_work_blocks):
@@ -286,28 +292,27 @@ def _add_dataset_to_blocks(
         if indices_array:
             r["loc_indices"] = indices_array
         else:
-            r["loc_indices"] = flex.size_t(range(r.size()))
+            r["loc_indices"] = flex.size_t_range(r.size())
         r = r.select(perm)
         r["dataset_id"] = flex.int(r.size(), dataset_id)
         # if data are sorted by asu_index, then up until boundary, should be in same
         # block (still need to read group_id though)
 
-        # sort data, get group ids and block_ids
-        group_ids = flex.int([])
-        boundary = self.properties_dict["miller_index_boundaries"][0]
-        boundary_id = 0
-        boundaries_for_this_datset = [0]  # use to slice
-        # make this a c++ method for speed?
-        for i, index in enumerate(sorted_asu_indices):
-            while index >= boundary:
-                boundaries_for_this_datset.append(i)
-                boundary_id += 1
-                boundary = self.properties_dict["miller_index_boundaries"][boundary_id]
-            group_id, _ = self.asu_index_dict[index]
-            group_ids.append(group_id)
-        while len(boundaries_for_this_datset) < self.n_work_blocks + 1:
-            # catch case where last boundaries aren't reached
-            boundaries_for_this_datset.append(len(sorted_asu_indices))
+        # sort data, get group ids and block_ids. Equivalent reflections are
+        # contiguous in the sorted data, so look up the ids once per run of
+        # equivalent reflections and expand to all reflections.
+        run_starts, run_lengths = _run_starts_and_lengths(sorted_asu_indices)
+        group_and_block_ids = np.array(
+            [self.asu_index_dict[sorted_asu_indices[int(i)]] for i in run_starts],
+            dtype=np.int32,
+        ).reshape(-1, 2)
+        group_ids = flex.int(np.repeat(group_and_block_ids[:, 0], run_lengths))
+        block_ids = np.repeat(group_and_block_ids[:, 1], run_lengths)
+        # the dataset boundaries for slicing are where each block starts
+        boundaries_for_this_datset = [0] + [
+            int(i)
+            for i in np.searchsorted(block_ids, np.arange(1, self.n_work_blocks + 1))
+        ]
         # so now have group ids as well for individual dataset
         if self.n_work_blocks == 1:
             self.Ih_table_blocks[0].add_data(dataset_id, group_ids, r)
@@ -526,12 +531,10 @@ def select_on_groups_isel(self, isel):
     def calc_Ih(self):
         """Calculate the current best estimate for Ih for each reflection group."""
         scale_factors = self.Ih_table["inverse_scale_factor"]
-        gsq = flex.pow2(scale_factors) * self.weights
-        sumgsq = gsq * self.h_index_matrix
-        gI = (scale_factors * self.Ih_table["intensity"]) * self.weights
-        sumgI = gI * self.h_index_matrix
-        Ih = sumgI / sumgsq
-        self.Ih_table["Ih_values"] = Ih * self.h_expand_matrix
+        gw = scale_factors * self.weights
+        sumgsq = (gw * scale_factors) * self.h_index_matrix
+        sumgI = (gw * self.Ih_table["intensity"]) * self.h_index_matrix
+        self.Ih_table["Ih_values"] = (sumgI / sumgsq) * self.h_expand_matrix
 
     def update_weights(self, error_model=None):
         """Update the scaling weights based on an error model."""
@@ -578,7 +581,7 @@ def match_Ih_values_to_target(self, target_Ih_table):
             if miller_idx in target_asu_Ih_dict:
                 i = location_in_unscaled_array
                 new_Ih_values.set_selected(
-                    flex.size_t(range(i, i + n_in_group)),
+                    flex.size_t_range(i, i + n_in_group),
                     flex.double(n_in_group, target_asu_Ih_dict[miller_idx]),
                 )
             location_in_unscaled_array += n_in_group
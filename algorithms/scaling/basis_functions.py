@@ -7,7 +7,6 @@
 
 from scitbx import sparse
 
-from dials.array_family import flex
 from dials_scaling_ext import row_multiply
 
 
@@ -33,8 +32,8 @@ def _calculate_scale_factors(apm, block_id, scales):
         components."""
         if not scales:
             return apm.constant_g_values[block_id]  # needs to return to set in Ih_table
-        multiplied_scale_factors = flex.double(scales[0].size(), 1.0)
-        for s in scales:
+        multiplied_scale_factors = scales[0].deep_copy()
+        for s in scales[1:]:
             multiplied_scale_factors *= s
         if apm.constant_g_values:
             multiplied_scale_factors *= apm.constant_g_values[block_id]
@@ -52,12 +51,13 @@ def _calculate_derivatives(apm, block_id, scales, derivatives_list):
         derivatives = sparse.matrix(apm.n_obs[block_id], apm.n_active_params)
         col_idx = 0
         for i, d in enumerate(derivatives_list):
-            scale_multipliers = flex.double(apm.n_obs[block_id], 1.0)
-            for j, s1 in enumerate(scales):
-                if i != j:
-                    scale_multipliers *= s1
+            # accumulate the product of all other scales in place
+            other_scales = [s1 for j, s1 in enumerate(scales) if i != j]
             if apm.constant_g_values:
-                scale_multipliers *= apm.constant_g_values[block_id]
+                other_scales.append(apm.constant_g_values[block_id])
+            scale_multipliers = other_scales[0].deep_copy()
+            for s1 in other_scales[1:]:
+                scale_multipliers *= s1
             next_deriv = row_multiply(d, scale_multipliers)
             derivatives.assign_block(next_deriv, 0, col_idx)
             col_idx += d.n_cols
@@ -42,8 +42,6 @@
 import logging
 import time
 
-import six
-
 from libtbx import phil
 
 logger = logging.getLogger("dials")
@@ -153,8 +151,7 @@ def cross_validate(params, cross_validator):
         cross_validator.set_results_dict_configuration(keys, values)
 
         for i, v in enumerate(itertools.product(*values)):
-            e = dict(zip(keys, v))
-            for k, val in six.iteritems(e):
+            for k, val in zip(keys, v):
                 params = cross_validator.set_parameter(params, k, val)
             for n in range(params.cross_validation.nfolds):
                 if n < 100.0 / free_set_percentage:
@@ -8,7 +8,6 @@
 from copy import deepcopy
 
 import pkg_resources
-import six
 
 from libtbx import phil
 from libtbx.table_utils import simple_table
@@ -84,9 +83,9 @@ def set_results_dict_configuration(self, keys, values):
         """Add configuration information to the results dict"""
         assert len(keys) == len(values)
         for i, v in enumerate(itertools.product(*values)):
-            e = dict(zip(keys, v))
-            for k, val in six.iteritems(e):
-                self.results_dict[i]["configuration"].append(str(k) + "=" + str(val))
+            self.results_dict[i]["configuration"].extend(
+                str(k) + "=" + str(val) for k, val in zip(keys, v)
+            )
 
     def add_results_to_results_dict(self, config_no, results):
         """Add the results to the correct place in the dict"""
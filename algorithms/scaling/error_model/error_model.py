@@ -7,6 +7,7 @@
 from collections import OrderedDict
 from math import exp, log
 
+import numpy as np
 import six
 
 from iotbx import phil
@@ -227,7 +228,6 @@ def _create_summation_matrix(self):
         per intensity bin unless there are very few reflections."""
         n = self.Ih_table.size
         self.binning_info["n_reflections"] = n
-        summation_matrix = sparse.matrix(n, self.n_bins)
         Ih = self.Ih_table.Ih_values * self.Ih_table.inverse_scale_factors
         size_order = flex.sort_permutation(Ih, reverse=True)
         Imax = max(Ih)
@@ -240,18 +240,29 @@ def _create_summation_matrix(self):
         self.binning_info["bin_boundaries"] = boundaries
         self.binning_info["refl_per_bin"] = flex.double()
 
+        # The intensities in a bin are a contiguous range of the sorted
+        # intensities, so find the bins by searching this rather than comparing
+        # every intensity against the limits of each bin. The ascending order
+        # is the reverse of size_order, so there is no need to sort again.
+        ascending_order = size_order.as_numpy_array()[::-1]
+        sorted_Ih = Ih.as_numpy_array()[ascending_order]
+
+        def bin_limits(maximum, minimum):
+            """Return the range in sorted_Ih of minimum < Ih <= maximum."""
+            hi = int(np.searchsorted(sorted_Ih, maximum, side="right"))
+            lo = int(np.searchsorted(sorted_Ih, minimum, side="right"))
+            return min(lo, hi), hi
+
         n_cumul = 0
         if Ih.size() > 100 * self.min_reflections_required:
             self.min_reflections_required = int(Ih.size() / 100.0)
         min_per_bin = min(self.min_reflections_required, int(n / (3.0 * self.n_bins)))
+        columns = []
         for i in range(len(boundaries) - 1):
             maximum = boundaries[i]
             minimum = boundaries[i + 1]
-            sel1 = Ih <= maximum
-            sel2 = Ih > minimum
-            sel = sel1 & sel2
-            isel = sel.iselection()
-            n_in_bin = isel.size()
+            lo, hi = bin_limits(maximum, minimum)
+            n_in_bin = hi - lo
             if n_in_bin < min_per_bin:  # need more in this bin
                 m = n_cumul + min_per_bin
                 if m < n:  # still some refl left to use
@@ -259,13 +270,12 @@ def _create_summation_matrix(self):
                     intensity = Ih[idx]
                     boundaries[i + 1] = intensity
                     minimum = boundaries[i + 1]
-                    sel = sel1 & (Ih > minimum)
-                    isel = sel.iselection()
-                    n_in_bin = isel.size()
+                    lo, hi = bin_limits(maximum, minimum)
+                    n_in_bin = hi - lo
             self.binning_info["refl_per_bin"].append(n_in_bin)
-            for j in isel:
-                summation_matrix[j, i] = 1
+            columns.append(dict.fromkeys(ascending_order[lo:hi].tolist(), 1.0))
             n_cumul += n_in_bin
+        summation_matrix = sparse.matrix(n, self.n_bins, columns)
         cols_to_del = []
         for i, col in enumerate(summation_matrix.cols()):
             if col.non_zeroes < min_per_bin - 5:
@@ -273,12 +283,8 @@ def _create_summation_matrix(self):
         n_new_cols = summation_matrix.n_cols - len(cols_to_del)
         if n_new_cols == self.n_bins:
             for i in range(len(boundaries) - 1):
-                maximum = boundaries[i]
-                minimum = boundaries[i + 1]
-                sel1 = Ih <= maximum
-                sel2 = Ih > minimum
-                sel = sel1 & sel2
-                m = flex.mean(Ih.select(sel))
+                lo, hi = bin_limits(boundaries[i], boundaries[i + 1])
+                m = flex.mean(flex.double(sorted_Ih[lo:hi]))
                 self.binning_info["mean_intensities"].append(m)
             return summation_matrix
         new_sum_matrix = sparse.matrix(summation_matrix.n_rows, n_new_cols)
@@ -295,12 +301,8 @@ def _create_summation_matrix(self):
         new_bounds.append(boundaries[-1])
         self.binning_info["bin_boundaries"] = new_bounds
         for i in range(len(new_bounds) - 1):
-            maximum = new_bounds[i]
-            minimum = new_bounds[i + 1]
-            sel1 = Ih <= maximum
-            sel2 = Ih > minimum
-            sel = sel1 & sel2
-            m = flex.mean(Ih.select(sel))
+            lo, hi = bin_limits(new_bounds[i], new_bounds[i + 1])
+            m = flex.mean(flex.double(sorted_Ih[lo:hi]))
             self.binning_info["mean_intensities"].append(m)
         return new_sum_matrix
 
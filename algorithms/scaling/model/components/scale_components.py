@@ -28,6 +28,31 @@
 from dials_scaling_ext import calculate_harmonic_tables_from_selections
 
 
+def _single_column_derivatives(values):
+    """Return an n x 1 sparse derivatives matrix with values as its only column.
+
+    The helper takes ownership of values, which is reshaped in place, so
+    callers should pass a temporary array."""
+    n = values.size()
+    derivatives = sparse.matrix(n, 1)
+    if n:
+        values.reshape(flex.grid(n, 1))
+        derivatives.assign_block(values, 0, 0)
+    return derivatives
+
+
+def b_factor_prefactor(cache, block_id, d_values):
+    """Return 1/(2d^2) for the d-values of a block.
+
+    The d-values are constant during minimisation, so the array is cached
+    and only recalculated when the block's d-values array is replaced."""
+    cached = cache.get(block_id)
+    if cached is None or cached[0] is not d_values:
+        cached = (d_values, 1.0 / (2.0 * (d_values * d_values)))
+        cache[block_id] = cached
+    return cached[1]
+
+
 class ScaleComponentBase(object):
     """
     Base scale component class.
@@ -231,9 +256,9 @@ def update_reflection_data(self, selection=None, block_selections=None):
     def calculate_scales_and_derivatives(self, block_id=0):
         """Calculate and return inverse scales and derivatives for a given block."""
         scales = flex.double(self.n_refl[block_id], self._parameters[0])
-        derivatives = sparse.matrix(self.n_refl[block_id], 1)
-        for i in range(self.n_refl[block_id]):
-            derivatives[i, 0] = 1.0
+        derivatives = _single_column_derivatives(
+            flex.double(self.n_refl[block_id], 1.0)
+        )
         return scales, derivatives
 
     def calculate_scales(self, block_id=0):
@@ -255,6 +280,7 @@ def __init__(self, initial_values, parameter_esds=None):
         """Set the initial parameter values, parameter esds and n_params."""
         super(SingleBScaleFactor, self).__init__(initial_values, parameter_esds)
         self._d_values = []
+        self._prefactors = {}
 
     @property
     def d_values(self):
@@ -290,25 +316,23 @@ def update_reflection_data(self, selection=None, block_selections=None):
         else:
             self._d_values = [data]
         self._n_refl = [dvalues.size() for dvalues in self._d_values]
+        self._prefactors = {}
 
     def calculate_scales_and_derivatives(self, block_id=0):
         """Calculate and return inverse scales and derivatives for a given block."""
-        d_squared = self._d_values[block_id] * self._d_values[block_id]
-        scales = flex.exp(
-            flex.double(self._n_refl[block_id], self._parameters[0]) / (2.0 * d_squared)
+        prefac = b_factor_prefactor(
+            self._prefactors, block_id, self._d_values[block_id]
         )
-        derivatives = sparse.matrix(self._n_refl[block_id], 1)
-        for i in range(self._n_refl[block_id]):
-            derivatives[i, 0] = scales[i] / (2.0 * d_squared[i])
+        scales = flex.exp(self._parameters[0] * prefac)
+        derivatives = _single_column_derivatives(scales * prefac)
         return scales, derivatives
 
     def calculate_scales(self, block_id=0):
         """Calculate and return inverse scales for a given block."""
-        scales = flex.exp(
-            flex.double(self._n_refl[block_id], self._parameters[0])
-            / (2.0 * (self._d_values[block_id] * self._d_values[block_id]))
+        prefac = b_factor_prefactor(
+            self._prefactors, block_id, self._d_values[block_id]
         )
-        return scales
+        return flex.exp(self._parameters[0] * prefac)
 
 
 class LinearDoseDecay(ScaleComponentBase):
@@ -371,14 +395,9 @@ def update_reflection_data(self, selection=None, block_selections=None):
 
     def calculate_scales_and_derivatives(self, block_id=0):
         """Calculate and return inverse scales and derivatives for a given block."""
-        scales = flex.exp(
-            self._parameters[0] * self._x[block_id] / self._d_values[block_id]
-        )
-        derivatives = sparse.matrix(self._n_refl[block_id], 1)
-        for i in range(self._n_refl[block_id]):
-            derivatives[i, 0] = scales[i] * (
-                self._x[block_id][i] / self._d_values[block_id][i]
-            )
+        x_over_d = self._x[block_id] / self._d_values[block_id]
+        scales = flex.exp(self._parameters[0] * x_over_d)
+        derivatives = _single_column_derivatives(scales * x_over_d)
         return scales, derivatives
 
     def calculate_scales(self, block_id=0):
@@ -401,14 +420,9 @@ class QuadraticDoseDecay(LinearDoseDecay):
 
     def calculate_scales_and_derivatives(self, block_id=0):
         """Calculate and return inverse scales and derivatives for a given block."""
-        scales = flex.exp(
-            self._parameters[0] * self._x[block_id] / (self._d_values[block_id] ** 2)
-        )
-        derivatives = sparse.matrix(self._n_refl[block_id], 1)
-        for i in range(self._n_refl[block_id]):
-            derivatives[i, 0] = scales[i] * (
-                self._x[block_id][i] / (self._d_values[block_id][i] ** 2)
-            )
+        x_over_dsq = self._x[block_id] / (self._d_values[block_id] ** 2)
+        scales = flex.exp(self._parameters[0] * x_over_dsq)
+        derivatives = _single_column_derivatives(scales * x_over_dsq)
         return scales, derivatives
 
     def calculate_scales(self, block_id=0):
@@ -568,11 +582,10 @@ def calculate_scales_and_derivatives(self, block_id=0):
             return self._calculate_scales_and_derivatives_memorymode(block_id)
 
     def _calculate_scales_and_derivatives_speedmode(self, block_id, derivatives=True):
-        abs_scale = flex.double(
-            self._harmonic_values[block_id].n_rows, 1.0
-        )  # Unity term
-        for i, col in enumerate(self._harmonic_values[block_id].cols()):
-            abs_scale += flex.double(col.as_dense_vector() * self._parameters[i])
+        # A single sparse matrix - dense vector product sums the harmonic terms
+        # for all reflections, then add the unity term.
+        abs_scale = self._harmonic_values[block_id] * self._parameters
+        abs_scale += 1.0
         if derivatives:
             return abs_scale, self._harmonic_values[block_id]
         return abs_scale
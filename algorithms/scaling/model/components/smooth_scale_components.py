@@ -7,12 +7,13 @@
 """
 from __future__ import absolute_import, division, print_function
 
-from math import ceil, floor
+from math import ceil
 
 from scitbx import sparse
 
 from dials.algorithms.scaling.model.components.scale_components import (
     ScaleComponentBase,
+    b_factor_prefactor,
 )
 from dials.array_family import flex
 from dials_refinement_helpers_ext import GaussianSmoother2D as GS2D
@@ -20,6 +21,16 @@
 from dials_scaling_ext import GaussianSmootherFirstFixed as GS1D
 from dials_scaling_ext import row_multiply
 
+
+def _zeroed_values_and_range(values):
+    """Shift the values to start at zero and return them with the integer
+    range covering them."""
+    vmin = flex.min(values)
+    vmax = flex.max(values)
+    # the shifted minimum is exactly zero, and the shifted maximum is vmax - vmin
+    return values - vmin, [0, max(ceil(round(vmax - vmin, 10)), 1)]
+
+
 # The following gaussian smoother classes make the implementation
 # consistent with that used in dials.refinement.
 
@@ -53,6 +64,10 @@ def positions(self):
         """Return the smoother positions."""
         return list(super(GaussianSmoother1D, self).positions())
 
+    def smoothing_parameters(self):
+        """Return the current number of points averaged and sigma."""
+        return (self.num_average(), self.sigma())
+
 
 class GaussianSmoother2D(GS2D):
     """A 2D Gaussian smoother."""
@@ -75,6 +90,10 @@ def y_positions(self):
         """Return the smoother y-positions."""
         return list(super(GaussianSmoother2D, self).y_positions())
 
+    def smoothing_parameters(self):
+        """Return the current numbers of points averaged and sigma."""
+        return (self.num_x_average(), self.num_y_average(), self.sigma())
+
 
 class GaussianSmoother3D(GS3D):
     """A 3D Gaussian smoother."""
@@ -101,6 +120,15 @@ def z_positions(self):
         """Return the smoother z-positions."""
         return list(super(GaussianSmoother3D, self).z_positions())
 
+    def smoothing_parameters(self):
+        """Return the current numbers of points averaged and sigma."""
+        return (
+            self.num_x_average(),
+            self.num_y_average(),
+            self.num_z_average(),
+            self.sigma(),
+        )
+
 
 class SmoothMixin(object):
     """Mixin class for smooth scale factor components.
@@ -123,6 +151,57 @@ def smoother(self):
         """The Gaussian smoother."""
         return self._smoother
 
+    def _cached_smoother_basis(self, block_id, coordinates):
+        """Return the cached smoother basis for a block, or None if there is no
+        basis for the current smoother, smoothing parameters and coordinates."""
+        cached = self._bases.get(block_id)
+        if cached is None:
+            return None
+        smoother, smoothing, cached_coordinates, basis = cached
+        if smoother is not self._smoother or any(
+            a is not b for a, b in zip(cached_coordinates, coordinates)
+        ):
+            return None
+        # set_smoothing changes the smoother in place
+        if smoothing != self._smoother.smoothing_parameters():
+            return None
+        return basis
+
+    def _smoother_basis(self, block_id, *coordinates):
+        """Return the normalised smoother weights for a block, as a sparse matrix.
+
+        The weights only depend on the smoother and the normalised coordinates,
+        not on the parameters, so they are cached until the smoother, its
+        smoothing parameters or the coordinates change, or the reflection data
+        are updated. The smoothed values are the product of
+        this matrix and the parameters, and it is also the matrix of derivatives
+        of the values."""
+        basis = self._cached_smoother_basis(block_id, coordinates)
+        if basis is None:
+            _, weight, sumweight = self._smoother.multi_value_weight(
+                *(coordinates + (self.value,))
+            )
+            basis = row_multiply(weight, 1.0 / sumweight)
+            self._bases[block_id] = (
+                self._smoother,
+                self._smoother.smoothing_parameters(),
+                coordinates,
+                basis,
+            )
+        return basis
+
+    def _smoothed_values(self, block_id, *coordinates):
+        """Return the smoothed values for a block.
+
+        A cached basis is reused, but one is not built just to calculate the
+        scales: when expanding the scales to all reflections each block is only
+        evaluated once, so the basis would cost extra time and memory."""
+        basis = self._cached_smoother_basis(block_id, coordinates)
+        if basis is not None:
+            return basis * self.value
+        value, _, __ = self._smoother.multi_value_weight(*(coordinates + (self.value,)))
+        return value
+
     @staticmethod
     def nparam_to_val(n_params):
         """Convert the number of parameters to the required input value
@@ -146,6 +225,7 @@ class SmoothScaleComponent1D(ScaleComponentBase, SmoothMixin):
     def __init__(self, initial_values, parameter_esds=None):
         super(SmoothScaleComponent1D, self).__init__(initial_values, parameter_esds)
         self._normalised_values = []
+        self._bases = {}
         self._fixed_initial = False
 
     def fix_initial_parameter(self):
@@ -213,15 +293,12 @@ def update_reflection_data(self, selection=None, block_selections=None):
         """Set the normalised coordinate values and configure the smoother."""
         self._normalised_values = []
         self._n_refl = []
+        self._bases = {}
         normalised_values = self.data["x"]
         if selection:
             normalised_values = normalised_values.select(selection)
         # Make sure zeroed correctly.
-        normalised_values = normalised_values - flex.min(normalised_values)
-        phi_range_deg = [
-            floor(round(flex.min(normalised_values), 10)),
-            max(ceil(round(flex.max(normalised_values), 10)), 1),
-        ]
+        normalised_values, phi_range_deg = _zeroed_values_and_range(normalised_values)
         self._smoother = GaussianSmoother1D(
             phi_range_deg, self.nparam_to_val(self._n_params)
         )
@@ -236,20 +313,13 @@ def update_reflection_data(self, selection=None, block_selections=None):
 
     def calculate_scales_and_derivatives(self, block_id=0):
         if self._n_refl[block_id] > 1:
+            basis = self._smoother_basis(block_id, self._normalised_values[block_id])
+            value = basis * self.value
             if self._fixed_initial:
-                (
-                    value,
-                    weight,
-                    sumweight,
-                ) = self._smoother.multi_value_weight_first_fixed(
-                    self._normalised_values[block_id], self.value
-                )
+                # there is no derivative for the fixed first parameter
+                dv_dp = basis.select_columns(flex.size_t_range(1, basis.n_cols))
             else:
-                value, weight, sumweight = self._smoother.multi_value_weight(
-                    self._normalised_values[block_id], self.value
-                )
-            inv_sw = 1.0 / sumweight
-            dv_dp = row_multiply(weight, inv_sw)
+                dv_dp = basis
         elif self._n_refl[block_id] == 1:
             if self._fixed_initial:
                 value, weight, sumweight = self._smoother.value_weight_first_fixed(
@@ -271,9 +341,7 @@ def calculate_scales_and_derivatives(self, block_id=0):
     def calculate_scales(self, block_id=0):
         """"Only calculate the scales if needed, for performance."""
         if self._n_refl[block_id] > 1:
-            value, _, __ = self._smoother.multi_value_weight(
-                self._normalised_values[block_id], self.value
-            )
+            value = self._smoothed_values(block_id, self._normalised_values[block_id])
         elif self._n_refl[block_id] == 1:
             value, _, __ = self._smoother.value_weight(
                 self._normalised_values[block_id][0], self.value
@@ -293,6 +361,7 @@ class SmoothBScaleComponent1D(SmoothScaleComponent1D):
     def __init__(self, initial_values, parameter_esds=None):
         super(SmoothBScaleComponent1D, self).__init__(initial_values, parameter_esds)
         self._d_values = []
+        self._prefactors = {}
 
     @property
     def d_values(self):
@@ -309,6 +378,7 @@ def update_reflection_data(self, selection=None, block_selections=None):
             selection, block_selections
         )
         self._d_values = []
+        self._prefactors = {}
         data = self.data["d"]
         if selection:
             data = data.select(selection)
@@ -324,14 +394,19 @@ def calculate_scales_and_derivatives(self, block_id=0):
         ).calculate_scales_and_derivatives(block_id)
         if self._n_refl[block_id] == 0:
             return flex.double([]), sparse.matrix(0, 0)
-        prefac = 1.0 / (2.0 * (self._d_values[block_id] * self._d_values[block_id]))
+        prefac = b_factor_prefactor(
+            self._prefactors, block_id, self._d_values[block_id]
+        )
         s = flex.exp(scales * prefac)
         d = row_multiply(derivatives, s * prefac)
         return s, d
 
     def calculate_scales(self, block_id=0):
         s = super(SmoothBScaleComponent1D, self).calculate_scales(block_id)
-        return flex.exp(s / (2.0 * flex.pow2(self._d_values[block_id])))
+        prefac = b_factor_prefactor(
+            self._prefactors, block_id, self._d_values[block_id]
+        )
+        return flex.exp(s * prefac)
 
     def calculate_restraints(self):
         residual = self.parameter_restraints * (self._parameters * self._parameters)
@@ -367,6 +442,7 @@ def __init__(self, initial_values, shape, parameter_esds=None):
         self._n_y_params = shape[1]
         self._normalised_x_values = None
         self._normalised_y_values = None
+        self._bases = {}
 
     @ScaleComponentBase.data.setter
     def data(self, data):
@@ -408,21 +484,14 @@ def update_reflection_data(self, selection=None, block_selections=None):
         self._normalised_x_values = []
         self._normalised_y_values = []
         self._n_refl = []
+        self._bases = {}
         normalised_x_values = self.data["x"]
         normalised_y_values = self.data["y"]
         if selection:
             normalised_x_values = normalised_x_values.select(selection)
             normalised_y_values = normalised_y_values.select(selection)
-        normalised_x_values = normalised_x_values - flex.min(normalised_x_values)
-        normalised_y_values = normalised_y_values - flex.min(normalised_y_values)
-        x_range = [
-            floor(round(flex.min(normalised_x_values), 10)),
-            max(ceil(round(flex.max(normalised_x_values), 10)), 1),
-        ]
-        y_range = [
-            floor(round(flex.min(normalised_y_values), 10)),
-            max(ceil(round(flex.max(normalised_y_values), 10)), 1),
-        ]
+        normalised_x_values, x_range = _zeroed_values_and_range(normalised_x_values)
+        normalised_y_values, y_range = _zeroed_values_and_range(normalised_y_values)
         self._smoother = GaussianSmoother2D(
             x_range,
             self.nparam_to_val(self._n_x_params),
@@ -441,13 +510,12 @@ def update_reflection_data(self, selection=None, block_selections=None):
 
     def calculate_scales_and_derivatives(self, block_id=0):
         if self._n_refl[block_id] > 1:
-            value, weight, sumweight = self._smoother.multi_value_weight(
+            dv_dp = self._smoother_basis(
+                block_id,
                 self._normalised_x_values[block_id],
                 self._normalised_y_values[block_id],
-                self.value,
             )
-            inv_sw = 1.0 / sumweight
-            dv_dp = row_multiply(weight, inv_sw)
+            value = dv_dp * self.value
         elif self._n_refl[block_id] == 1:
             value, weight, sumweight = self._smoother.value_weight(
                 self._normalised_x_values[block_id][0],
@@ -466,10 +534,10 @@ def calculate_scales_and_derivatives(self, block_id=0):
     def calculate_scales(self, block_id=0):
         """Only calculate the scales if needed, for performance."""
         if self._n_refl[block_id] > 1:
-            value, _, __ = self._smoother.multi_value_weight(
+            value = self._smoothed_values(
+                block_id,
                 self._normalised_x_values[block_id],
                 self._normalised_y_values[block_id],
-                self.value,
             )
         elif self._n_refl[block_id] == 1:
             value, _, __ = self._smoother.value_weight(
@@ -507,6 +575,7 @@ def __init__(self, initial_values, shape, parameter_esds=None):
         self._normalised_x_values = None
         self._normalised_y_values = None
         self._normalised_z_values = None
+        self._bases = {}
 
     def set_new_parameters(self, new_parameters, shape):
         """Set new parameters of a different length i.e. after batch handling"""
@@ -559,6 +628,7 @@ def update_reflection_data(self, selection=None, block_selections=None):
         self._normalised_y_values = []
         self._normalised_z_values = []
         self._n_refl = []
+        self._bases = {}
         normalised_x_values = self.data["x"]
         normalised_y_values = self.data["y"]
         normalised_z_values = self.data["z"]
@@ -567,21 +637,9 @@ def update_reflection_data(self, selection=None, block_selections=None):
             normalised_y_values = normalised_y_values.select(selection)
             normalised_z_values = normalised_z_values.select(selection)
         """Set the normalised coordinate values and configure the smoother."""
-        normalised_x_values = normalised_x_values - flex.min(normalised_x_values)
-        normalised_y_values = normalised_y_values - flex.min(normalised_y_values)
-        normalised_z_values = normalised_z_values - flex.min(normalised_z_values)
-        x_range = [
-            floor(round(flex.min(normalised_x_values), 10)),
-            max(ceil(round(flex.max(normalised_x_values), 10)), 1),
-        ]
-        y_range = [
-            floor(round(flex.min(normalised_y_values), 10)),
-            max(ceil(round(flex.max(normalised_y_values), 10)), 1),
-        ]
-        z_range = [
-            floor(round(flex.min(normalised_z_values), 10)),
-            max(ceil(round(flex.max(normalised_z_values), 10)), 1),
-        ]
+        normalised_x_values, x_range = _zeroed_values_and_range(normalised_x_values)
+        normalised_y_values, y_range = _zeroed_values_and_range(normalised_y_values)
+        normalised_z_values, z_range = _zeroed_values_and_range(normalised_z_values)
         self._smoother = GaussianSmoother3D(
             x_range,
             self.nparam_to_val(self._n_x_params),
@@ -604,14 +662,13 @@ def update_reflection_data(self, selection=None, block_selections=None):
 
     def calculate_scales_and_derivatives(self, block_id=0):
         if self._n_refl[block_id] > 1:
-            value, weight, sumweight = self._smoother.multi_value_weight(
+            dv_dp = self._smoother_basis(
+                block_id,
                 self._normalised_x_values[block_id],
                 self._normalised_y_values[block_id],
                 self._normalised_z_values[block_id],
-                self.value,
             )
-            inv_sw = 1.0 / sumweight
-            dv_dp = row_multiply(weight, inv_sw)
+            value = dv_dp * self.value
         elif self._n_refl[block_id] == 1:
             value, weight, sumweight = self._smoother.value_weight(
                 self._normalised_x_values[block_id][0],
@@ -631,11 +688,11 @@ def calculate_scales_and_derivatives(self, block_id=0):
     def calculate_scales(self, block_id=0):
         """"Only calculate the scales if needed, for performance."""
         if self._n_refl[block_id] > 1:
-            value, _, __ = self._smoother.multi_value_weight(
+            value = self._smoothed_values(
+                block_id,
                 self._normalised_x_values[block_id],
                 self._normalised_y_values[block_id],
                 self._normalised_z_values[block_id],
-                self.value,
             )
         elif self._n_refl[block_id] == 1:
             value, _, __ = self._smoother.value_weight(
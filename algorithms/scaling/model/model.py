@@ -390,10 +390,8 @@ def _add_absorption_component_to_physically_derived_model(model, reflection_tabl
             "sph_harm_table": sph_harm_table(reflection_table, lmax)
         }
     surface_weight = model.configdict["abs_surface_weight"]
-    parameter_restraints = flex.double([])
-    for i in range(1, lmax + 1):
-        parameter_restraints.extend(flex.double([1.0] * ((2 * i) + 1)))
-    parameter_restraints *= surface_weight
+    # there are (2l + 1) parameters for each order l, so lmax * (lmax + 2) in total
+    parameter_restraints = flex.double(lmax * (lmax + 2), surface_weight)
     model.components["absorption"].parameter_restraints = parameter_restraints
 
 
@@ -842,6 +840,13 @@ def plot_model_components(self):
         return d
 
 
+def _normalise(values, offset, width):
+    """Return (values - offset) / width, allocating a single new array."""
+    normalised = values - offset
+    normalised /= width
+    return normalised
+
+
 class ArrayScalingModel(ScalingModelBase):
     """A scaling model for an array-based parameterisation."""
 
@@ -892,30 +897,31 @@ def configure_components(self, reflection_table, experiment, params):
         xyz = reflection_table["xyzobs.px.value"].parts()
         norm_time = xyz[2] * self.configdict["time_norm_fac"]
         if "decay" in self.components:
-            d = reflection_table["d"]
-            norm_res = (
-                (1.0 / flex.pow2(d)) - self.configdict["resmin"]
-            ) / self.configdict["res_bin_width"]
+            norm_res = _normalise(
+                1.0 / flex.pow2(reflection_table["d"]),
+                self.configdict["resmin"],
+                self.configdict["res_bin_width"],
+            )
             self.components["decay"].data = {"x": norm_res, "y": norm_time}
         if "absorption" in self.components:
-            norm_x_abs = (xyz[0] - self.configdict["xmin"]) / self.configdict[
-                "x_bin_width"
-            ]
-            norm_y_abs = (xyz[1] - self.configdict["ymin"]) / self.configdict[
-                "y_bin_width"
-            ]
+            norm_x_abs = _normalise(
+                xyz[0], self.configdict["xmin"], self.configdict["x_bin_width"]
+            )
+            norm_y_abs = _normalise(
+                xyz[1], self.configdict["ymin"], self.configdict["y_bin_width"]
+            )
             self.components["absorption"].data = {
                 "x": norm_x_abs,
                 "y": norm_y_abs,
                 "z": norm_time,
             }
         if "modulation" in self.components:
-            norm_x_det = (xyz[0] - self.configdict["xmin"]) / self.configdict[
-                "x_det_bin_width"
-            ]
-            norm_y_det = (xyz[1] - self.configdict["ymin"]) / self.configdict[
-                "y_det_bin_width"
-            ]
+            norm_x_det = _normalise(
+                xyz[0], self.configdict["xmin"], self.configdict["x_det_bin_width"]
+            )
+            norm_y_det = _normalise(
+                xyz[1], self.configdict["ymin"], self.configdict["y_det_bin_width"]
+            )
             self.components["modulation"].data = {"x": norm_x_det, "y": norm_y_det}
 
     def limit_image_range(self, new_image_range):
@@ -577,21 +577,26 @@ def expand_scales_to_all_reflections(self, caller=None, calc_cov=False):
         n_param_tot = sum(c.n_params for c in self.components.values())
         for i in range(1, n_blocks + 1):  # do calc in blocks for speed/memory
             n_end = int(i * self.n_suitable_refl / n_blocks)
-            block_isel = flex.size_t(range(n_start, n_end))
+            block_isel = flex.size_t_range(n_start, n_end)
             n_start = n_end
             scales = flex.double(block_isel.size(), 1.0)
             scales_list = []
             derivs_list = []
-            jacobian = sparse.matrix(block_isel.size(), n_param_tot)
             for component in self.components.values():
                 component.update_reflection_data(block_selections=[block_isel])
-                comp_scales, d = component.calculate_scales_and_derivatives(block_id=0)
-                scales_list.append(comp_scales)
+                # the derivatives are only needed for the variance calculation
                 if calc_cov:
+                    comp_scales, d = component.calculate_scales_and_derivatives(
+                        block_id=0
+                    )
                     derivs_list.append(d)
+                else:
+                    comp_scales = component.calculate_scales(block_id=0)
+                scales_list.append(comp_scales)
                 scales *= comp_scales
             all_scales.extend(scales)
             if calc_cov and self.var_cov_matrix.non_zeroes > 0:
+                jacobian = sparse.matrix(block_isel.size(), n_param_tot)
                 n_cumulative_param = 0
                 for j, component in enumerate(self.components):
                     d_block = derivs_list[j]
@@ -824,21 +829,25 @@ def make_ready_for_scaling(self, outlier=True):
 
     def clean_reflection_table(self):
         """Remove additional added columns that are not required for output."""
-        self._initial_keys.append("inverse_scale_factor")
-        self._initial_keys.append("inverse_scale_factor_variance")
-        self._initial_keys.append("Ih_values")
-        self._initial_keys.append("intensity.scale.value")
-        self._initial_keys.append("intensity.scale.variance")
+        keep = set(self._initial_keys)
+        keep.update(
+            [
+                "inverse_scale_factor",
+                "inverse_scale_factor_variance",
+                "Ih_values",
+                "intensity.scale.value",
+                "intensity.scale.variance",
+            ]
+        )
+        keep.discard("Esq")
         self.reflection_table["intensity.scale.value"] = self.reflection_table[
             "intensity"
         ]
         self.reflection_table["intensity.scale.variance"] = self.reflection_table[
             "variance"
         ]
-        if "Esq" in self.reflection_table:
-            del self.reflection_table["Esq"]
         for key in self.reflection_table.keys():
-            if key not in self._initial_keys:
+            if key not in keep:
                 del self._reflection_table[key]
         bad = self._reflection_table.get_flags(
             self._reflection_table.flags.bad_for_scaling, all=False
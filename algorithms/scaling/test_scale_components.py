@@ -197,6 +197,46 @@ def test_SmoothScaleFactor1D():
     assert list(s) == list(s2)
 
 
+def test_smoother_basis_cache():
+    """Test that the cached smoother basis agrees with the smoother and is
+    dropped when the smoothing or the reflection data change."""
+    SF = SmoothScaleComponent1D(flex.double([1.0, 1.2, 0.9, 1.1, 1.3]))
+    SF.data = {"x": flex.double([0.5, 1.0, 2.5, 0.0, 3.2])}
+    SF.update_reflection_data()
+
+    def check_against_smoother(s, d):
+        value, weight, sumweight = SF.smoother.multi_value_weight(
+            SF.normalised_values[0], SF.value
+        )
+        assert list(s) == pytest.approx(list(value))
+        for i in range(d.n_rows):
+            for j in range(d.n_cols):
+                assert d[i, j] == pytest.approx(weight[i, j] / sumweight[i])
+
+    # calculating the scales alone does not build the basis
+    uncached = SF.calculate_scales()
+    assert SF._bases == {}
+    s, d = SF.calculate_scales_and_derivatives()
+    assert 0 in SF._bases
+    assert list(s) == pytest.approx(list(uncached))
+    check_against_smoother(s, d)
+    # the cached basis is reused by both calculations
+    s2, d2 = SF.calculate_scales_and_derivatives()
+    assert list(s2) == list(s)
+    assert list(SF.calculate_scales()) == list(s)
+    check_against_smoother(s2, d2)
+
+    # set_smoothing changes the smoother in place, which invalidates the basis
+    SF.smoother.set_smoothing(4, 1.0)
+    s3, d3 = SF.calculate_scales_and_derivatives()
+    check_against_smoother(s3, d3)
+    assert list(SF.calculate_scales()) == list(s3)
+
+    # updating the reflection data drops the cached bases
+    SF.update_reflection_data()
+    assert SF._bases == {}
+
+
 def test_SmoothBScaleFactor1D():
     "test for a gaussian smoothed 1D scalefactor object"
     SF = SmoothBScaleComponent1D(flex.double(5, 0.0))
@@ -98,9 +98,9 @@ def single_exp():
     return Experiment(scan=scan, crystal=crystal)
 
 
-@pytest.fixture
-def physical_param():
-    """Generate the scaling phil param scope."""
+@pytest.fixture(scope="session")
+def _physical_param():
+    """Parse the scaling phil param scope once per session."""
     phil_scope = phil.parse(
         """
       include scope dials.algorithms.scaling.model.model.model_phil_scope
@@ -118,14 +118,21 @@ def physical_param():
     return parameters
 
 
+@pytest.fixture
+def physical_param(_physical_param):
+    """Generate the scaling phil param scope."""
+    # tests modify the parameters, so give each its own copy
+    return copy.deepcopy(_physical_param)
+
+
 def mock_single_Ih_table():
     """Mock Ih table to use for testing the target function."""
     Ih_table = Mock()
     Ih_table.inverse_scale_factors = flex.double([1.0, 1.0 / 1.1, 1.0])
     Ih_table.intensities = flex.double([10.0, 10.0, 12.0])
-    Ih_table.Ih_values = flex.double([11.0, 11.0, 11.0])
+    Ih_table.Ih_values = flex.double(3, 11.0)
     # These values should give residuals of [-1.0, 0.0, 1.0]
-    Ih_table.weights = flex.double([1.0, 1.0, 1.0])
+    Ih_table.weights = flex.double(3, 1.0)
     Ih_table.size = 3
     Ih_table.derivatives = sparse.matrix(3, 1, [{0: 1.0, 1: 2.0, 2: 3.0}])
     Ih_table.h_index_matrix = sparse.matrix(3, 2, [{0: 1, 1: 1}, {2: 1}])
@@ -414,48 +421,55 @@ def test_target_jacobian_calculation_finite_difference(
 def calculate_gradient_fd(target, scaler, apm):
     """Calculate gradient array with finite difference approach."""
     delta = 1.0e-6
-    gradients = flex.double([0.0] * apm.n_active_params)
+    gradients = flex.double(apm.n_active_params, 0.0)
     Ih_table = scaler.Ih_table.blocked_data_list[0]
+    x = copy.copy(apm.x)
+    new_x = copy.copy(x)
     # iterate over parameters, varying one at a time and calculating the gradient
     for i in range(apm.n_active_params):
-        new_x = copy.copy(apm.x)
-        new_x[i] -= 0.5 * delta
+        new_x[i] = x[i] - 0.5 * delta
         apm.set_param_vals(new_x)
         scaler.update_for_minimisation(apm, 0)
         R_low = flex.pow2(target.calculate_residuals(Ih_table)) * Ih_table.weights
-        new_x[i] += delta
+        new_x[i] = x[i] + 0.5 * delta
         apm.set_param_vals(new_x)
         scaler.update_for_minimisation(apm, 0)
         R_upper = flex.pow2(target.calculate_residuals(Ih_table)) * Ih_table.weights
-        new_x[i] -= 0.5 * delta
-        apm.set_param_vals(new_x)
-        scaler.update_for_minimisation(apm, 0)
-        gradients[i] = (flex.sum(R_upper) - flex.sum(R_low)) / delta
+        new_x[i] = x[i]
+        R_upper -= R_low
+        gradients[i] = flex.sum(R_upper) / delta
+    # restore the model to the unperturbed parameters once at the end
+    apm.set_param_vals(x)
+    scaler.update_for_minimisation(apm, 0)
     return gradients
 
 
 def calculate_jacobian_fd(target, scaler, apm, block_id=0):
     """Calculate jacobian matrix with finite difference approach."""
     delta = 1.0e-7
-    jacobian = sparse.matrix(
-        scaler.Ih_table.blocked_data_list[block_id].size, apm.n_active_params
-    )
     Ih_table = scaler.Ih_table.blocked_data_list[block_id]
+    columns = []
+    x = copy.copy(apm.x)
+    new_x = copy.copy(x)
     # iterate over parameters, varying one at a time and calculating the residuals
     for i in range(apm.n_active_params):
-        new_x = copy.copy(apm.x)
-        new_x[i] -= 0.5 * delta
+        new_x[i] = x[i] - 0.5 * delta
         apm.set_param_vals(new_x)
         scaler.update_for_minimisation(apm, 0)
         R_low = target.calculate_residuals(Ih_table)  # unweighted unsquared residual
-        new_x[i] += delta
+        new_x[i] = x[i] + 0.5 * delta
         apm.set_param_vals(new_x)
         scaler.update_for_minimisation(apm, 0)
         R_upper = target.calculate_residuals(Ih_table)  # unweighted unsquared residual
-        new_x[i] -= 0.5 * delta
-        apm.set_param_vals(new_x)
-        scaler.update_for_minimisation(apm, 0)
+        new_x[i] = x[i]
         fin_difference = (R_upper - R_low) / delta
-        for j in range(fin_difference.size()):
-            jacobian[j, i] = fin_difference[j]
-    return jacobian
+        columns.append(
+            {
+                j: fin_difference[j]
+                for j in fin_difference.as_numpy_array().nonzero()[0].tolist()
+            }
+        )
+    # restore the model to the unperturbed parameters once at the end
+    apm.set_param_vals(x)
+    scaler.update_for_minimisation(apm, 0)
+    return sparse.matrix(Ih_table.size, apm.n_active_params, columns)
@@ -3,6 +3,8 @@
 import collections
 import math
 
+import numpy as np
+
 from cctbx import sgtbx, uctbx
 from libtbx.math_utils import nearest_integer as nint
 from scitbx import matrix
@@ -488,13 +490,12 @@ def estimate_resolution_limit_distl_method2(reflections, plot_filename=None):
 
     binner = binner_d_star_cubed(d_spacings)
 
-    bin_counts = flex.size_t()
-
-    for i_slot, slot in enumerate(binner.bins):
-        sel_all = (d_spacings < slot.d_max) & (d_spacings >= slot.d_min)
-        sel = sel_all
-
-        bin_counts.append(sel.count(True))
+    # count the spots with d_min <= d < d_max in each bin by searching the sorted
+    # d-spacings once, rather than comparing all of them against every bin
+    d_sorted = np.sort(d_spacings.as_numpy_array())
+    n_below_max = np.searchsorted(d_sorted, [slot.d_max for slot in binner.bins])
+    n_below_min = np.searchsorted(d_sorted, [slot.d_min for slot in binner.bins])
+    bin_counts = flex.size_t((n_below_max - n_below_min).tolist())
 
     # print list(bin_counts)
     t0 = (bin_counts[0] + bin_counts[1]) / 2
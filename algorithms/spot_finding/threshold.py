@@ -1,5 +1,8 @@
 from __future__ import absolute_import, division, print_function
 
+from dials.algorithms.image import threshold
+from dials.array_family import flex
+
 
 class ThresholdStrategy(object):
     """
@@ -43,8 +46,11 @@ def __init__(self, **kwargs):
         # Save the constant gain
         self._gain_map = None
 
-        # Create a buffer
+        # Create a buffer, and remember the most recently used entry since
+        # consecutive images almost always have the same shape
         self.algorithm = {}
+        self._last_shape = None
+        self._last_algorithm = None
 
     def __call__(self, image, mask):
         """
@@ -54,22 +60,24 @@ def __call__(self, image, mask):
         :param mask: The mask to use
         :return: The thresholded image
         """
-        from dials.algorithms.image import threshold
-        from dials.array_family import flex
-
         # Initialise the algorithm
-        try:
-            algorithm = self.algorithm[image.all()]
-        except Exception:
-            algorithm = threshold.DispersionThreshold(
-                image.all(),
-                self._kernel_size,
-                self._n_sigma_b,
-                self._n_sigma_s,
-                self._threshold,
-                self._min_count,
-            )
-            self.algorithm[image.all()] = algorithm
+        shape = image.all()
+        if shape == self._last_shape:
+            algorithm = self._last_algorithm
+        else:
+            algorithm = self.algorithm.get(shape)
+            if algorithm is None:
+                algorithm = threshold.DispersionThreshold(
+                    shape,
+                    self._kernel_size,
+                    self._n_sigma_b,
+                    self._n_sigma_s,
+                    self._threshold,
+                    self._min_count,
+                )
+                self.algorithm[shape] = algorithm
+            self._last_shape = shape
+            self._last_algorithm = algorithm
 
         # Set the gain
         if self._gain is not None:
@@ -77,8 +85,9 @@ def __call__(self, image, mask):
             self._gain_map = flex.double(image.accessor(), self._gain)
             self._gain = None
 
-        # Compute the threshold
-        result = flex.bool(flex.grid(image.all()))
+        # Compute the threshold. The algorithm writes every output pixel, but a
+        # new result is allocated each call since callers hold on to the mask
+        result = flex.bool(flex.grid(shape))
         if self._gain_map:
             algorithm(image, mask, self._gain_map, result)
         else:
@@ -112,8 +121,11 @@ def __init__(self, **kwargs):
         # Save the constant gain
         self._gain_map = None
 
-        # Create a buffer
+        # Create a buffer, and remember the most recently used entry since
+        # consecutive images almost always have the same shape
         self.algorithm = {}
+        self._last_shape = None
+        self._last_algorithm = None
 
     def __call__(self, image, mask):
         """
@@ -123,22 +135,24 @@ def __call__(self, image, mask):
         :param mask: The mask to use
         :return: The thresholded image
         """
-        from dials.algorithms.image import threshold
-        from dials.array_family import flex
-
         # Initialise the algorithm
-        try:
-            algorithm = self.algorithm[image.all()]
-        except Exception:
-            algorithm = threshold.DispersionExtendedThreshold(
-                image.all(),
-                self._kernel_size,
-                self._n_sigma_b,
-                self._n_sigma_s,
-                self._threshold,
-                self._min_count,
-            )
-            self.algorithm[image.all()] = algorithm
+        shape = image.all()
+        if shape == self._last_shape:
+            algorithm = self._last_algorithm
+        else:
+            algorithm = self.algorithm.get(shape)
+            if algorithm is None:
+                algorithm = threshold.DispersionExtendedThreshold(
+                    shape,
+                    self._kernel_size,
+                    self._n_sigma_b,
+                    self._n_sigma_s,
+                    self._threshold,
+                    self._min_count,
+                )
+                self.algorithm[shape] = algorithm
+            self._last_shape = shape
+            self._last_algorithm = algorithm
 
         # Set the gain
         if self._gain is not None:
@@ -146,8 +160,9 @@ def __call__(self, image, mask):
             self._gain_map = flex.double(image.accessor(), self._gain)
             self._gain = None
 
-        # Compute the threshold
-        result = flex.bool(flex.grid(image.all()))
+        # Compute the threshold. The algorithm writes every output pixel, but a
+        # new result is allocated each call since callers hold on to the mask
+        result = flex.bool(flex.grid(shape))
         if self._gain_map:
             algorithm(image, mask, self._gain_map, result)
         else:
@@ -178,13 +178,17 @@ def run(self, args=None):
             if experiment.imageset not in imagesets:
                 imagesets.append(experiment.imageset)
 
+        # only the centroids are needed for the plot, so avoid copying the whole
+        # table (including any shoeboxes) for each imageset
+        centroids = flex.reflection_table()
+        centroids["xyzobs.px.value"] = reflections["xyzobs.px.value"]
         for imageset in imagesets:
             selected = flex.bool(reflections.nrows(), False)
             for i, experiment in enumerate(experiments):
                 if experiment.imageset is not imageset:
                     continue
                 selected.set_selected(reflections["id"] == i, True)
-            ascii_plot = spot_counts_per_image_plot(reflections.select(selected))
+            ascii_plot = spot_counts_per_image_plot(centroids.select(selected))
             if len(ascii_plot):
                 logger.info("\nHistogram of per-image spot count for imageset %i:" % i)
                 logger.info(ascii_plot)
@@ -6,8 +6,6 @@
 import os
 import sys
 
-import matplotlib
-
 import iotbx.phil
 from cctbx import crystal, miller
 from cctbx.array_family import flex
@@ -340,6 +338,9 @@ def plot_projections(
 ):
     projections_all = projections
 
+    # import here so that runs without a plot don't pay for matplotlib
+    import matplotlib
+
     # http://matplotlib.org/faq/howto_faq.html#generate-images-without-having-a-window-appear
     matplotlib.use("Agg")  # use a non-interactive backend
     from matplotlib import pylab, pyplot
@@ -0,0 +1,164 @@
+from __future__ import absolute_import, division, print_function
+
+import math
+import random
+
+import numpy as np
+import pytest
+
+from dials.algorithms.refinement.analysis.centroid_analysis import (
+    RAD2DEG,
+    CentroidAnalyser,
+    _block_indices,
+    _find_blocks,
+)
+from dials.array_family import flex
+
+
+def _make_reflections(nref=2000, nexp=2, scan_width_deg=90.0, phi_step_deg=None):
+    """Generate reflections with small centroid residuals. If phi_step_deg is
+    set, the observed phi values are rounded to multiples of it, so that many
+    reflections share the same phi"""
+    rng = random.Random(42)
+    reflections = flex.reflection_table()
+    reflections["miller_index"] = flex.miller_index(
+        [(rng.randint(1, 10), 1, 1) for _ in range(nref)]
+    )
+    reflections["id"] = flex.int([rng.randrange(nexp) for _ in range(nref)])
+    xyzobs = flex.vec3_double()
+    xyzcal = flex.vec3_double()
+    for _ in range(nref):
+        x = rng.uniform(1, 100)
+        y = rng.uniform(1, 100)
+        phi = rng.uniform(0, scan_width_deg)
+        if phi_step_deg:
+            phi = round(phi / phi_step_deg) * phi_step_deg
+        z = phi / RAD2DEG
+        xyzobs.append((x, y, z))
+        xyzcal.append(
+            (
+                x + rng.gauss(0, 0.1),
+                y + rng.gauss(0, 0.1),
+                z + 0.001 * math.sin(10 * z),
+            )
+        )
+    reflections["xyzobs.mm.value"] = xyzobs
+    reflections["xyzcal.mm"] = xyzcal
+    return reflections
+
+
+def _brute_force_blocks(phi):
+    """Reference block search, counting the reflections in every block with an
+    explicit mask. Blocks are half-open intervals starting at
+    min(phi) + i * block_size, except the last, which also includes max(phi).
+    Return the number of blocks, the block size and the masks"""
+    phi_start, phi_end = min(phi), max(phi)
+    phi_width = phi_end - phi_start
+    ideal_block_size = 1.0
+    old_nblocks = 0
+    while True:
+        nblocks = int(phi_width // ideal_block_size)
+        if nblocks == old_nblocks:
+            nblocks -= 1
+        nblocks = max(nblocks, 1)
+        block_size = phi_width / nblocks
+        masks = []
+        for i in range(nblocks):
+            lo = phi_start + block_size * i
+            if i < nblocks - 1:
+                hi = phi_start + block_size * (i + 1)
+                masks.append([lo <= p < hi for p in phi])
+            else:
+                masks.append([lo <= p <= phi_end for p in phi])
+        counts = [sum(m) for m in masks]
+        if nblocks == 1:
+            break
+        min_nr = min(counts)
+        if min_nr >= 50:
+            break
+        if min_nr < 5:
+            fac = 2
+        else:
+            fac = 50 / min_nr
+        ideal_block_size *= fac
+        old_nblocks = nblocks
+    return nblocks, block_size, masks
+
+
+def _masked_mean(values, mask):
+    selected = [v for v, m in zip(values, mask) if m]
+    return sum(selected) / len(selected) if selected else 0.0
+
+
+@pytest.mark.parametrize(
+    "scan_width_deg,phi_step_deg", [(90.0, None), (30.0, 0.25), (0.8, None)]
+)
+def test_blocks_against_brute_force(scan_width_deg, phi_step_deg):
+    reflections = _make_reflections(
+        scan_width_deg=scan_width_deg, phi_step_deg=phi_step_deg
+    )
+    results = CentroidAnalyser(reflections)(calc_periodograms=False)
+
+    assert len(results) == 2
+    for iexp, exp_data in enumerate(results):
+        refs = reflections.select(reflections["id"] == iexp)
+        x_obs, y_obs, phi_obs = refs["xyzobs.mm.value"].parts()
+        x_cal, y_cal, phi_cal = refs["xyzcal.mm"].parts()
+        phi = list(phi_obs * RAD2DEG)
+
+        nblocks, block_size, masks = _brute_force_blocks(phi)
+        assert exp_data["nblocks"] == nblocks
+        assert exp_data["block_size"] == pytest.approx(block_size)
+        assert list(exp_data["nref_per_block"]) == [sum(m) for m in masks]
+        assert sum(exp_data["nref_per_block"]) == len(refs)
+        if scan_width_deg <= 1.0:
+            assert nblocks == 1
+
+        for key, resid in (
+            ("av_x_resid_per_block", x_cal - x_obs),
+            ("av_y_resid_per_block", y_cal - y_obs),
+            ("av_phi_resid_per_block", phi_cal - phi_obs),
+        ):
+            expected = [_masked_mean(resid, m) for m in masks]
+            av = list(exp_data[key])
+            assert len(av) == nblocks
+            if nblocks > 2 and block_size < 3.0:
+                # the extreme blocks are replaced by their neighbours
+                assert av[0] == av[1]
+                assert av[-1] == av[-2]
+                av, expected = av[1:-1], expected[1:-1]
+            assert av == pytest.approx(expected)
+
+
+def test_blocks_with_phi_on_block_edges():
+    # phi on a quarter-degree grid, so that every internal block edge coincides
+    # with observed values
+    phi = np.repeat(np.arange(81) * 0.25, 20)
+    nblocks, block_size, edges, counts = _find_blocks(phi, 0.0, 20.0)
+    ref_nblocks, ref_block_size, masks = _brute_force_blocks(list(phi))
+
+    assert nblocks > 1
+    assert np.isin(edges, phi).all()
+    assert nblocks == ref_nblocks
+    assert block_size == ref_block_size
+    assert list(counts) == [sum(m) for m in masks]
+    idx = _block_indices(phi, edges)
+    for i, mask in enumerate(masks):
+        assert list(idx == i) == mask
+
+
+def test_callback_agrees_with_fast_path():
+    reflections = _make_reflections()
+    results = CentroidAnalyser(reflections)(calc_periodograms=False)
+    # a generic callback takes the slow path, which must agree with the fast one
+    ref = CentroidAnalyser(reflections, av_callback=lambda x: flex.mean(x))(
+        calc_periodograms=False
+    )
+
+    for exp_data, ref_data in zip(results, ref):
+        for key in (
+            "av_x_resid_per_block",
+            "av_y_resid_per_block",
+            "av_phi_resid_per_block",
+        ):
+            assert list(exp_data[key]) == pytest.approx(list(ref_data[key]))